@@ -1,14 +1,8 @@
 from intent_classifier import predict as pred_intent
-from index_sections import search_section
+from index_sections import search_section, lookup_answer, load_companies, load_aliases
+from intents import INTENT_TO_KEYWORDS, INTENT_TO_SECTION, boosted_query, canonical_query
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 import re
-import os
-
-def load_companies():
-    path = "data/companies.txt"
-    if not os.path.exists(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        return [c.strip() for c in f.readlines() if c.strip()]
 
 COMPANIES = load_companies()
 
@@ -19,11 +13,7 @@ def detect_company(query):
     companies = load_companies()
 
     # Load alias file
-    alias_path = "data/company_aliases.json"
-    aliases = {}
-    if os.path.exists(alias_path):
-        with open(alias_path, "r", encoding="utf-8") as f:
-            aliases = json.load(f)
+    aliases = load_aliases()
 
     # 1. Check aliases first (smart detection)
     for alias, full_name in aliases.items():
@@ -38,33 +28,38 @@ def detect_company(query):
     return None
 
 
-INTENT_TO_KEYWORDS = {
-    "ENV_TARGETS": ["emissions", "targets", "net zero"],
-    "ENV_POLICIES": ["climate", "policy", "renewable"],
-    "SOC_POLICIES": ["employee", "diversity", "training"],
-    "SOC_IMPACT": ["community", "impact", "CSR"],
-    "GOV_STRUCTURE": ["board", "committee", "oversight"],
-    "GOV_COMPLIANCE": ["audit", "compliance", "ethics"]
-}
-
-INTENT_TO_SECTION = {
-    "ENV_TARGETS": ["ENV"],
-    "ENV_POLICIES": ["ENV"],
-    "SOC_POLICIES": ["SOC"],
-    "SOC_IMPACT": ["SOC"],
-    "GOV_STRUCTURE": ["GOV"],
-    "GOV_COMPLIANCE": ["GOV"]
-}
+def is_canonical(query, company, intent):
+    # e.g. "What are Infosys's emissions targets?": nothing beyond the
+    # company, the intent keywords and stop words
+    known = {w for k in INTENT_TO_KEYWORDS[intent] for w in re.findall(r"\w+", k.lower())}
+    known |= set(re.findall(r"\w+", company.lower()))
+    known |= {w for a, full in load_aliases().items() if full == company
+              for w in re.findall(r"\w+", a.lower())}
+
+    words = re.findall(r"\w\w+", query.lower())
+    return all(w in known or w in ENGLISH_STOP_WORDS for w in words)
 
 def ask(query):
     intent = pred_intent(query)
     section = INTENT_TO_SECTION[intent]
-    boosted = query + " " + " ".join(INTENT_TO_KEYWORDS[intent])
+    boosted = boosted_query(query, intent)
 
     # Detect company
     company = detect_company(query)
 
-    if company:
+    # canonical questions are scored as canonical_query(), the same string
+    # the answer table was built from, so table and live results match
+    canonical = bool(company) and is_canonical(query, company, intent)
+    results = lookup_answer(company, intent, top_k=3) if canonical else None
+    from_table = results is not None
+
+    if from_table:
+        print(f"[INFO] Company detected: {company} (precomputed answer)")
+    elif canonical:
+        print(f"[INFO] Company detected: {company}")
+        results = search_section(canonical_query(company, intent), section, top_k=3,
+                                 company_filter=company)
+    elif company:
         print(f"[INFO] Company detected: {company}")
         results = search_section(boosted, section, top_k=3, company_filter=company)
     else:
@@ -76,6 +71,7 @@ def ask(query):
         "intent": intent,
         "section_lookup": section,
         "company": company or "GLOBAL",
+        "source": "answer_table" if from_table else "live",
         "results": results
     }
 
@@ -0,0 +1,88 @@
+import os
+import time
+import uuid
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+import index_ir
+import index_sections
+from snapshots import MIN_KEEP
+
+# One vocabulary for both retrieval paths (unigrams + bigrams, as in index_ir).
+# This is the only build path: index_ir.py --build and index_sections.py --build
+# both come here. No max_df: the old document-only max_df=0.8 over six reports
+# removed core terms such as board, climate, oversight, audit and renewable (the
+# intent keywords), so document queries on them barely matched anything.
+VOCAB_PARAMS = dict(
+    stop_words="english",
+    ngram_range=(1, 2),
+    token_pattern=r"(?u)\b\w\w+\b"
+)
+
+def build_all(keep=2, quantize_bits=None, answers=None, n_components_svd=0):
+    """
+    Build the section index and the document index in one pass:
+    summaries are parsed and tokenized once, document rows are the sums
+    of their section rows, and both indexes share one vectorizer (IDF
+    fitted on section rows).
+    """
+    # checked before anything is published, so the two indexes stay in step
+    if keep < MIN_KEEP:
+        raise ValueError(f"keep must be at least {MIN_KEEP}, got {keep}")
+
+    t0 = time.perf_counter()
+
+    items = index_ir.load_summaries(index_ir.SUMMARIES_DIR)
+    docs, files, file_ids, section_ids = index_sections.sections_from_items(items)
+
+    # summaries without section text keep index_ir's fallback text as their own row
+    with_sections = set(file_ids)
+    extra = [i for i in range(len(items)) if i not in with_sections]
+
+    counter = CountVectorizer(**VOCAB_PARAMS)
+    C = counter.fit_transform(docs + [items[i]["text"] for i in extra])
+
+    # (items x rows) 0/1 matrix: document counts = sum of their rows' counts
+    owner = np.concatenate([np.array(file_ids, dtype=np.int64), np.array(extra, dtype=np.int64)])
+    S = sparse.csr_matrix((np.ones(len(owner)), (owner, np.arange(len(owner)))),
+                          shape=(len(items), len(owner)))
+
+    tfidf = TfidfTransformer().fit(C)
+    X_sections = tfidf.transform(C[:len(docs)])
+    X_docs = tfidf.transform(S @ C)
+
+    # query-side vectorizer with the same vocabulary and IDF; fitted attributes are
+    # set directly, since vocabulary= would keep a second copy of the term dict
+    vectorizer = TfidfVectorizer(**VOCAB_PARAMS)
+    vectorizer.vocabulary_ = counter.vocabulary_
+    vectorizer.idf_ = tfidf.idf_
+
+    # the vectorizer is pickled once, into the section snapshot, and linked
+    # into the document snapshot
+    vocab_id = uuid.uuid4().hex
+    snap = index_sections.write_index(vectorizer, X_sections, docs, files, file_ids, section_ids,
+                                      keep=keep, quantize_bits=quantize_bits, answers=answers,
+                                      vocab_id=vocab_id)
+    index_ir.write_index(vectorizer, X_docs, items, n_components_svd=n_components_svd,
+                         keep=keep, vocab_id=vocab_id,
+                         vectorizer_file=os.path.join(snap, index_sections.VECTORIZER_NAME))
+
+    print(f"Built both indexes on one vocabulary ({len(counter.vocabulary_)} terms) "
+          f"in {time.perf_counter() - t0:.2f}s")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build section and document indexes together.")
+    parser.add_argument("--keep", type=int, default=2, help="Snapshots to keep after a build (at least 2)")
+    parser.add_argument("--quantize", type=int, choices=[0, 8, 16], default=None,
+                        help="Also store an 8/16-bit section matrix for first-pass scoring, "
+                             "0 to drop it (default: as in current snapshot)")
+    parser.add_argument("--answers", action=argparse.BooleanOptionalAction, default=None,
+                        help="Precompute company x intent answers (default: as in current snapshot)")
+    parser.add_argument("--svd", type=int, default=0,
+                        help="Optional SVD dimension for the document index (0 to disable)")
+    args = parser.parse_args()
+
+    build_all(keep=args.keep, quantize_bits=args.quantize, answers=args.answers,
+              n_components_svd=args.svd)
@@ -1,11 +1,16 @@
-import os, json, re
+import os, json, re, zlib, hashlib
+import numpy as np
 
 RAW_TEXT_PATH = "data/text/"
 CLEAN_PATH = "data/clean/"
 ESG_PATH = "data/esg_segments/"
+DEDUP_PATH = "data/dedup/"
 
 os.makedirs(CLEAN_PATH, exist_ok=True)
 os.makedirs(ESG_PATH, exist_ok=True)
+os.makedirs(DEDUP_PATH, exist_ok=True)
+
+SIGNATURE_STORE = os.path.join(DEDUP_PATH, "minhash_signatures.npz")
 
 # STEP 1: CLEAN TEXT
 def clean_text(t):
@@ -22,11 +27,160 @@ def quick_paragraphs(text):
     paras = re.split(r'\n+', text)
     return [p.strip() for p in paras if len(p.strip()) > 50]
 
-# STEP 3: ESG SEGMENTATION
+# STEP 3 — NEAR-DUPLICATE PARAGRAPH REMOVAL (MinHash + LSH)
+# Reports repeat disclaimers, headers and policy blurbs; only the first copy
+# of each near-duplicate paragraph is kept.
+NUM_PERM = 128
+BANDS, ROWS = 16, 8             # LSH candidate threshold ~ (1/16)^(1/8) = 0.71
+SHINGLE_SIZE = 5                # word shingles
+DEDUP_THRESHOLD = 0.8           # estimated Jaccard needed to count as duplicate
+_PRIME = (1 << 31) - 1
+
+_rng = np.random.RandomState(42)
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+def minhash(para):
+    words = re.findall(r"\w+", para.lower())
+    n = max(1, len(words) - SHINGLE_SIZE + 1)
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(n)}
+    h = np.array([zlib.crc32(sh.encode("utf-8")) for sh in shingles],
+                 dtype=np.uint64) % _PRIME
+    # (a*h + b) mod p per permutation; a, h < 2^31 so nothing overflows uint64
+    return ((np.outer(h, _PERM_A) + _PERM_B) % _PRIME).min(axis=0).astype(np.uint32)
+
+class MinHashDeduper:
+    """
+    LSH index over paragraph signatures.
+    - within_doc: drop repeats inside the current file
+    - cross_corpus: also drop paragraphs already seen in other files
+    Signatures, a content hash per file and the files each file's dropped
+    paragraphs matched persist in SIGNATURE_STORE, so unchanged files are
+    skipped and new ones are checked incrementally against the corpus
+    without re-reading it. A store written in the other mode is discarded.
+    """
+
+    def __init__(self, cross_corpus=False, store_path=SIGNATURE_STORE):
+        self.cross_corpus = cross_corpus
+        self.mode = "cross" if cross_corpus else "within"
+        self.store_path = store_path
+        self.sigs, self.files = {}, {}    # signature id -> signature / file
+        self.by_file = {}                 # file -> signature ids
+        self.hashes = {}                  # file -> content hash
+        self.matched = {}                 # file -> files holding paragraphs it dropped
+        self.buckets = {}                 # (band, key) -> signature ids
+        self.next_id = 0
+
+        if os.path.exists(store_path):
+            data = np.load(store_path)
+            if str(data["mode"]) == self.mode:
+                for sig, f in zip(data["sigs"], data["files"]):
+                    self._add(sig, str(f))
+                self.hashes = dict(zip(map(str, data["hash_files"]), map(str, data["hashes"])))
+                for f, other in zip(data["match_files"], data["match_others"]):
+                    self.matched.setdefault(str(f), set()).add(str(other))
+
+    def content_hash(self, text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def unchanged(self, file, text):
+        return self.hashes.get(file) == self.content_hash(text)
+
+    def dependents(self, files):
+        # files plus every file that dropped a paragraph because one of them
+        # held it (transitively): their output changes when these are rebuilt
+        out, todo = set(files), list(files)
+        while todo:
+            f = todo.pop()
+            for other, matched in self.matched.items():
+                if f in matched and other not in out:
+                    out.add(other)
+                    todo.append(other)
+        return out
+
+    def _band_keys(self, sig):
+        return [(b, sig[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS)]
+
+    def _add(self, sig, file):
+        idx = self.next_id
+        self.next_id += 1
+        self.sigs[idx] = sig
+        self.files[idx] = file
+        self.by_file.setdefault(file, []).append(idx)
+        for key in self._band_keys(sig):
+            self.buckets.setdefault(key, set()).add(idx)
+
+    def _find_duplicate(self, sig, file):
+        # returns the file holding a near-duplicate, or None
+        seen = set()
+        for key in self._band_keys(sig):
+            for idx in sorted(self.buckets.get(key, ())):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                other = self.files[idx]
+                if other != file and not self.cross_corpus:
+                    continue
+                if np.mean(self.sigs[idx] == sig) >= DEDUP_THRESHOLD:
+                    return other
+        return None
+
+    def forget(self, file):
+        # re-processing a file must not match against its own old signatures
+        for idx in self.by_file.pop(file, []):
+            for key in self._band_keys(self.sigs[idx]):
+                self.buckets[key].discard(idx)
+                if not self.buckets[key]:
+                    del self.buckets[key]
+            del self.sigs[idx], self.files[idx]
+        self.hashes.pop(file, None)
+        self.matched.pop(file, None)
+
+    def filter(self, file, paras, text):
+        # text: the file's full content, hashed to detect it is unchanged later
+        self.forget(file)
+        self.hashes[file] = self.content_hash(text)
+        kept, matched = [], set()
+        stats = {"mode": self.mode, "paragraphs": len(paras),
+                 "dropped_within": 0, "dropped_cross": 0}
+
+        for para in paras:
+            sig = minhash(para)
+            dup = self._find_duplicate(sig, file)
+            if dup is None:
+                kept.append(para)
+                self._add(sig, file)
+            elif dup == file:
+                stats["dropped_within"] += 1
+            else:
+                stats["dropped_cross"] += 1
+                matched.add(dup)
+
+        if matched:
+            self.matched[file] = matched
+        stats["kept"] = len(kept)
+        return kept, stats
+
+    def save(self):
+        ids = sorted(self.sigs)
+        pairs = ([f for f, m in self.matched.items() for _ in m],
+                 [o for m in self.matched.values() for o in sorted(m)])
+        np.savez(self.store_path,
+                 sigs=np.array([self.sigs[i] for i in ids], dtype=np.uint32).reshape(-1, NUM_PERM),
+                 files=np.array([self.files[i] for i in ids], dtype=str),
+                 hash_files=np.array(list(self.hashes), dtype=str),
+                 hashes=np.array(list(self.hashes.values()), dtype=str),
+                 match_files=np.array(pairs[0], dtype=str),
+                 match_others=np.array(pairs[1], dtype=str),
+                 mode=np.array(self.mode))
+
+
+# STEP 4: ESG SEGMENTATION
 def segment_esg(text):
-    sections = {"E": [], "S": [], "G": []}
+    return segment_paragraphs(quick_paragraphs(text))
 
-    paras = quick_paragraphs(text)
+def segment_paragraphs(paras):
+    sections = {"E": [], "S": [], "G": []}
 
     # keyword lists (broad + stable across ESG reports)
     E_KEYS = ["climate", "carbon", "emission", "energy", "environment", "sustainab",
@@ -71,32 +225,78 @@ def segment_esg(text):
     return sections
 
 
-# STEP 4: PROCESS EACH TEXT FILE
-for file in os.listdir(RAW_TEXT_PATH):
-    if not file.endswith(".txt"):
-        continue
+# STEP 5: PROCESS EACH TEXT FILE
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-dedup", action="store_true", help="Keep near-duplicate paragraphs")
+    parser.add_argument("--cross-corpus", action="store_true",
+                        help="Also drop paragraphs already seen in other reports")
+    args = parser.parse_args()
+
+    dedup = None if args.no_dedup else MinHashDeduper(cross_corpus=args.cross_corpus)
 
-    with open(os.path.join(RAW_TEXT_PATH, file), "r", encoding="utf-8") as f:
-        raw = f.read()
+    def json_path(file):
+        return os.path.join(ESG_PATH, file.replace(".txt", ".json"))
 
-    cleaned = clean_text(raw)
+    def up_to_date(file, cleaned):
+        # unchanged text and an existing JSON deduped in the same mode
+        # (a --no-dedup run rewrites the JSONs without touching the store)
+        if not dedup.unchanged(file, cleaned) or not os.path.exists(json_path(file)):
+            return False
+        with open(json_path(file), "r", encoding="utf-8") as f:
+            return json.load(f).get("dedup", {}).get("mode") == dedup.mode
 
-    # save cleaned version
-    clean_out = os.path.join(CLEAN_PATH, file)
-    with open(clean_out, "w", encoding="utf-8") as f:
-        f.write(cleaned)
+    files = sorted(f for f in os.listdir(RAW_TEXT_PATH) if f.endswith(".txt"))
+    texts = {}
+    for file in files:
+        with open(os.path.join(RAW_TEXT_PATH, file), "r", encoding="utf-8") as f:
+            texts[file] = clean_text(f.read())
 
-    # segment into ESG
-    seg = segment_esg(cleaned)
+    todo = set(files)
+    if dedup is not None:
+        # reports removed from RAW_TEXT_PATH count as changed too
+        changed = {f for f in files if not up_to_date(f, texts[f])} | (set(dedup.by_file) - set(files))
+        todo = dedup.dependents(changed)
+        # forget everything first, so nothing re-matches a stale signature;
+        # then, in sorted order, the first report holding a shared paragraph keeps it
+        for file in todo:
+            dedup.forget(file)
 
-    # save structured JSON
-    json_out = os.path.join(ESG_PATH, file.replace(".txt", ".json"))
-    with open(json_out, "w", encoding="utf-8") as f:
-        json.dump({
-            "file": file,
+    for file in files:
+        cleaned = texts[file]
+        json_out = json_path(file)
+
+        if file not in todo:
+            print("Unchanged, skipped:", file)
+            continue
+
+        # save cleaned version
+        clean_out = os.path.join(CLEAN_PATH, file)
+        with open(clean_out, "w", encoding="utf-8") as f:
+            f.write(cleaned)
+
+        # segment into ESG
+        out = {"file": file}
+        paras = quick_paragraphs(cleaned)
+        if dedup is not None:
+            paras, stats = dedup.filter(file, paras, cleaned)
+            out["dedup"] = stats
+            print(f"Dedup {file}: kept {stats['kept']}/{stats['paragraphs']} paragraphs "
+                  f"({stats['dropped_within']} within, {stats['dropped_cross']} cross-corpus)")
+        seg = segment_paragraphs(paras)
+
+        out.update({
             "environmental": seg["E"],
             "social": seg["S"],
             "governance": seg["G"]
-        }, f, indent=4)
+        })
+
+        # save structured JSON
+        with open(json_out, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=4)
+
+        print("Processed:", file)
 
-    print("Processed:", file)
\ No newline at end of file
+    if dedup is not None:
+        dedup.save()
@@ -10,16 +10,27 @@ from sklearn.decomposition import TruncatedSVD
 import joblib
 import re
 
+from text_store import write_store, TextStore
+from snapshots import new_snapshot, publish, gc, SnapshotCache, load_shared, link_or_copy, dump_pickle
+
 # Paths
 SUMMARIES_DIR = "data/summaries/"
 INDEX_DIR = "data/index/"
 os.makedirs(INDEX_DIR, exist_ok=True)
 
-# Files to write
-VECTORIZER_PATH = os.path.join(INDEX_DIR, "tfidf_vectorizer.joblib")
-MATRIX_PATH = os.path.join(INDEX_DIR, "tfidf_matrix.npz")
-METADATA_PATH = os.path.join(INDEX_DIR, "metadata.json")
-SVD_PATH = os.path.join(INDEX_DIR, "svd_transformer.joblib")  # optional
+# Files to write (inside each snapshot directory)
+VECTORIZER_NAME = "tfidf_vectorizer.joblib"
+MATRIX_NAME = "tfidf_matrix.npz"
+METADATA_NAME = "metadata.json"
+SVD_NAME = "svd_transformer.joblib"  # optional
+
+# per-document text fields, stored consecutively in the text store;
+# "fallback" is only non-empty when a doc has no section text (see load_summaries),
+# otherwise the doc text is rebuilt with join_sections()
+FIELDS = ["env", "soc", "gov", "fallback"]
+
+def join_sections(env: str, soc: str, gov: str) -> str:
+    return " ".join([seg for seg in [env, soc, gov] if seg and len(seg.strip())>0])
 
 # utility: load summaries
 def load_summaries(folder: str) -> List[Dict]:
@@ -43,7 +54,7 @@ def load_summaries(folder: str) -> List[Dict]:
         env = pick_section(j, "environment")
         soc = pick_section(j, "social")
         gov = pick_section(j, "governance")
-        full_text = " ".join([seg for seg in [env, soc, gov] if seg and len(seg.strip())>0])
+        full_text = join_sections(env, soc, gov)
         if not full_text.strip():
             # fallback: try any top-level text fields
             for v in j.values():
@@ -70,53 +81,86 @@ def extract_keyphrases(vectorizer: TfidfVectorizer, doc_vec, topn=5) -> List[str
     return feature_names[indices].tolist()
 
 # main: build index
-def build_index(n_components_svd: int = 0):
-    items = load_summaries(SUMMARIES_DIR)
-    docs = [it["text"] for it in items]
-    ids = [it["file"] for it in items]
+def build_index(n_components_svd: int = 0, keep: int = 2):
+    # both indexes are always built together on one vocabulary
+    from build_indexes import build_all
+    build_all(keep=keep, n_components_svd=n_components_svd)
 
-    # Vectorizer: use unigrams + bigrams to improve phrase matching
-    vectorizer = TfidfVectorizer(
-        stop_words="english",
-        ngram_range=(1,2),
-        max_df=0.8,
-        min_df=1,
-        token_pattern=r"(?u)\b\w\w+\b"
-    )
-    X = vectorizer.fit_transform(docs)
+# write a document index into a new snapshot and publish it;
+# vocab_id tags a vectorizer shared with the section index (build_indexes.py),
+# vectorizer_file is its already pickled copy
+def write_index(vectorizer: TfidfVectorizer, X, items: List[Dict],
+                n_components_svd: int = 0, keep: int = 2, vocab_id: str = None,
+                vectorizer_file: str = None):
+    snap = new_snapshot(INDEX_DIR)
+    ids = [it["file"] for it in items]
     # Optional dimensionality reduction (fast retrieval) — use 0 to disable
     svd = None
     if n_components_svd and n_components_svd < min(X.shape):
         svd = TruncatedSVD(n_components=n_components_svd, random_state=42)
         X = svd.fit_transform(X)
-        joblib.dump(svd, SVD_PATH)
+        joblib.dump(svd, os.path.join(snap, SVD_NAME))
 
     # save artifacts
-    joblib.dump(vectorizer, VECTORIZER_PATH)
+    if vectorizer_file:
+        link_or_copy(vectorizer_file, os.path.join(snap, VECTORIZER_NAME))
+    else:
+        dump_pickle(vectorizer, os.path.join(snap, VECTORIZER_NAME))
     # save matrix with joblib (sparse ok)
-    joblib.dump(X, MATRIX_PATH)
-    # metadata
-    metadata = {"ids": ids, "items": items}
-    with open(METADATA_PATH, "w", encoding="utf-8") as f:
+    joblib.dump(X, os.path.join(snap, MATRIX_NAME))
+    # metadata: ids only; texts go to the text store (doc i, field k -> i * len(FIELDS) + k)
+    def stored(it, k):
+        if k == "fallback":
+            return "" if join_sections(it["env"], it["soc"], it["gov"]) else it["text"]
+        return it[k]
+    write_store(snap, [stored(it, k) for it in items for k in FIELDS])
+    metadata = {"ids": ids, "fields": FIELDS, "vocab_id": vocab_id}
+    with open(os.path.join(snap, METADATA_NAME), "w", encoding="utf-8") as f:
         json.dump(metadata, f, indent=2)
-    print(f"Indexed {len(ids)} documents. Vectorizer -> {VECTORIZER_PATH}, matrix -> {MATRIX_PATH}")
+    # publish atomically, then drop old snapshots
+    version = publish(INDEX_DIR, snap)
+    gc(INDEX_DIR, keep=keep)
+    print(f"Indexed {len(ids)} documents. Snapshot: {version}")
+
+def load_index(snap: str) -> Dict:
+    with open(os.path.join(snap, METADATA_NAME), "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    svd_path = os.path.join(snap, SVD_NAME)
+    return {
+        # one in-memory copy when the section index shares this vocabulary
+        "vectorizer": load_shared(metadata.get("vocab_id"),
+                                  lambda: joblib.load(os.path.join(snap, VECTORIZER_NAME))),
+        "X": joblib.load(os.path.join(snap, MATRIX_NAME)),
+        "svd": joblib.load(svd_path) if os.path.exists(svd_path) else None,
+        "ids": metadata["ids"],
+        "fields": metadata["fields"],
+        "store": TextStore(snap),
+    }
+
+# reloads automatically when a new snapshot is published
+_index = SnapshotCache(INDEX_DIR, load_index)
 
 # search function
 def search(query: str, top_k: int = 5) -> List[Dict]:
-    vectorizer: TfidfVectorizer = joblib.load(VECTORIZER_PATH)
-    X = joblib.load(MATRIX_PATH)
-    with open(METADATA_PATH, "r", encoding="utf-8") as f:
-        metadata = json.load(f)
-    ids = metadata["ids"]
-    items = metadata["items"]
+    index = _index.get()
+    vectorizer: TfidfVectorizer = index["vectorizer"]
+    X = index["X"]
+    ids = index["ids"]
+    fields = index["fields"]
+    store = index["store"]
+
+    def field(i, name, max_chars=None):
+        return store.get(i * len(fields) + fields.index(name), max_chars=max_chars)
+
+    def doc_text(i):
+        return join_sections(field(i, "env"), field(i, "soc"), field(i, "gov")) or field(i, "fallback")
 
     qv = vectorizer.transform([query])
     # if we applied SVD, X may be dense with lower dim; check and project query
     if isinstance(X, np.ndarray) and X.ndim == 2 and X.shape[1] != qv.shape[1]:
-        # load svd if present
-        if os.path.exists(SVD_PATH):
-            svd = joblib.load(SVD_PATH)
-            qv = svd.transform(qv)
+        # project with the snapshot's svd if present
+        if index["svd"] is not None:
+            qv = index["svd"].transform(qv)
     # compute cos sim
     # ensure both arrays are dense 2D
     if hasattr(X, "toarray"):
@@ -129,18 +173,18 @@ def search(query: str, top_k: int = 5) -> List[Dict]:
     results = []
     for i in top_idx:
         score = float(sims[i])
-        it = items[i]
         # compute top keyphrases for the doc using original vectorizer
-        doc_vec = vectorizer.transform([it["text"]])
+        doc_vec = vectorizer.transform([doc_text(i)])
         kps = extract_keyphrases(vectorizer, doc_vec, topn=6)
+        env = field(i, "env")
         results.append({
             "file": ids[i],
             "score": score,
             "key_phrases": kps,
-            "env": it.get("env"),
-            "soc": it.get("soc"),
-            "gov": it.get("gov"),
-            "snippet": (it.get("env") or it.get("text") or "")[:400]
+            "env": env,
+            "soc": field(i, "soc"),
+            "gov": field(i, "gov"),
+            "snippet": env[:400] or doc_text(i)[:400]
         })
     return results
 
@@ -152,15 +196,22 @@ if __name__ == "__main__":
     parser.add_argument("--query", type=str, default=None, help="Run a query")
     parser.add_argument("--topk", type=int, default=5, help="Top-K results")
     parser.add_argument("--svd", type=int, default=0, help="Optional SVD dimension (0 to disable)")
+    parser.add_argument("--keep", type=int, default=2, help="Snapshots to keep after a build (at least 2)")
+    parser.add_argument("--json", action="store_true", help="Print query results as JSON")
     args = parser.parse_args()
 
     if args.build:
-        build_index(n_components_svd=args.svd)
+        build_index(n_components_svd=args.svd, keep=args.keep)
     elif args.query:
         res = search(args.query, top_k=args.topk)
-        for r in res:
-            print("===\nFile:", r["file"], "\nScore:", r["score"])
-            print("Key phrases:", r["key_phrases"])
-            print("Snippet:", r["snippet"][:300])
+        if args.json:
+            print(json.dumps({"query": args.query, "results": [
+                {"file": r["file"], "score": r["score"], "key_phrases": r["key_phrases"],
+                 "text": r["snippet"]} for r in res]}, indent=4))
+        else:
+            for r in res:
+                print("===\nFile:", r["file"], "\nScore:", r["score"])
+                print("Key phrases:", r["key_phrases"])
+                print("Snippet:", r["snippet"][:300])
     else:
         print("Run with --build to build index or --query 'your query' to search.")
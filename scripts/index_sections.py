@@ -1,131 +1,365 @@
 import os
 import json
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
+import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 
+from text_store import write_store, TextStore
+from snapshots import (new_snapshot, publish, gc, current_version, snapshot_dir,
+                       SnapshotCache, load_shared, dump_pickle)
+from intents import INTENT_TO_KEYWORDS, INTENT_TO_SECTION, canonical_query
+from quantized import (quantize, save_quantized, load_quantized, stored_bits, approx_scores,
+                       nbytes_csr, nbytes_quantized)
+
 INDEX_DIR = "data/index_sections/"
-SUMMARIES_DIR = "data/summaries/"
+COMPANIES_PATH = "data/companies.txt"
+ALIASES_PATH = "data/company_aliases.json"
 
 os.makedirs(INDEX_DIR, exist_ok=True)
 
-VECTORIZER_PATH = os.path.join(INDEX_DIR, "vec.joblib")
-MATRIX_PATH = os.path.join(INDEX_DIR, "matrix.joblib")
-META_PATH = os.path.join(INDEX_DIR, "meta.json")
+# file names inside each snapshot directory
+VECTORIZER_NAME = "vec.joblib"
+MATRIX_NAME = "matrix.joblib"
+META_NAME = "meta.json"
+FILE_IDS_NAME = "file_ids.npy"
+SECTION_IDS_NAME = "section_ids.npy"
+FILE_PTR_NAME = "file_ptr.npy"                  # rows of file f: file_ptr[f]:file_ptr[f+1]
+SECTION_ROWS_NAME = "section_rows.npy"          # row ids grouped by section code
+SECTION_PTR_NAME = "section_ptr.npy"            # section s: section_rows[ptr[s]:ptr[s+1]]
+ANSWERS_NAME = "answers.json"                   # optional company x intent table
 
-def build_index():
-    docs = []      # section text
-    meta = []      # {file, section}
+# section codes are stored per row as small integers into this table
+SECTIONS = ["ENV", "SOC", "GOV"]
 
-    for fname in os.listdir(SUMMARIES_DIR):
-        if not fname.endswith(".json"):
-            continue
-        
-        path = os.path.join(SUMMARIES_DIR, fname)
-        with open(path, "r", encoding="utf-8") as f:
-            j = json.load(f)
-        
-        file_id = j.get("file", fname)
-
-        # pick rewritten first, else extractive
-        def pick(section):
-            return (
-                j.get(f"{section}_summary_rewritten")
-                or " ".join(j.get(f"{section}_summary_extractive", []))
-                or ""
-            )
-        
-        env = pick("environment")
-        soc = pick("social")
-        gov = pick("governance")
-
-        if env.strip():
-            docs.append(env)
-            meta.append({"file": file_id, "section": "ENV", "text": env})
-
-        if soc.strip():
-            docs.append(soc)
-            meta.append({"file": file_id, "section": "SOC", "text": soc})
-
-        if gov.strip():
-            docs.append(gov)
-            meta.append({"file": file_id, "section": "GOV", "text": gov})
-
-    vectorizer = TfidfVectorizer(stop_words="english")
-    X = vectorizer.fit_transform(docs)
-
-    joblib.dump(vectorizer, VECTORIZER_PATH)
-    joblib.dump(X, MATRIX_PATH)
-
-    with open(META_PATH, "w", encoding="utf-8") as f:
-        json.dump(meta, f, indent=4)
-
-    print("Indexed", len(meta), "section-level documents.")
+# quantized first pass: rescore this many candidates per requested result
+RESCORE_FACTOR = 10
+
+def sections_from_items(items):
+    """
+    Section rows from [{"file", "env", "soc", "gov"}], one item per summary.
+    Returns (docs, files, file_ids, section_ids); files has one entry per item.
+    """
+    docs = []         # section text
+    files = []        # file id table
+    file_ids = []     # per row: index into files
+    section_ids = []  # per row: index into SECTIONS
+
+    for it in items:
+        files.append(it["file"])
+
+        for code, text in enumerate([it["env"], it["soc"], it["gov"]]):
+            if text.strip():
+                docs.append(text)
+                file_ids.append(len(files) - 1)
+                section_ids.append(code)
+
+    return docs, files, file_ids, section_ids
+
+def build_index(keep=2, quantize_bits=None, answers=None):
+    # both indexes are always built together on one vocabulary
+    from build_indexes import build_all
+    build_all(keep=keep, quantize_bits=quantize_bits, answers=answers)
+
+def write_index(vectorizer, X, docs, files, file_ids, section_ids,
+                keep=2, quantize_bits=None, answers=None, vocab_id=None):
+    """
+    Write a section index into a new snapshot, publish it and return its path.
+    vocab_id tags a vectorizer shared with the document index (build_indexes.py).
+    quantize_bits / answers = None keep what the current snapshot has, so a
+    rebuild that doesn't mention them (e.g. index_ir.py --build) keeps them.
+    """
+    current = current_version(INDEX_DIR)
+    current_snap = snapshot_dir(INDEX_DIR, current) if current is not None else None
+    if quantize_bits is None:
+        quantize_bits = stored_bits(current_snap) if current_snap else 0
+    if answers is None:
+        answers = current_snap is not None and os.path.exists(
+            os.path.join(current_snap, ANSWERS_NAME))
+
+    snap = new_snapshot(INDEX_DIR)
+
+    dump_pickle(vectorizer, os.path.join(snap, VECTORIZER_NAME))
+    joblib.dump(X, os.path.join(snap, MATRIX_NAME))
+    if quantize_bits:
+        Q = quantize(X, bits=quantize_bits)
+        save_quantized(snap, Q)
+        print(f"Quantized matrix ({quantize_bits}-bit): {nbytes_quantized(Q)} bytes "
+              f"vs {nbytes_csr(X)} full precision")
+
+    np.save(os.path.join(snap, FILE_IDS_NAME), np.array(file_ids, dtype=np.int32))
+    np.save(os.path.join(snap, SECTION_IDS_NAME), np.array(section_ids, dtype=np.int8))
+    write_store(snap, docs)
+
+    # filter tables: rows are appended file by file, so each file is a row range
+    file_ptr = np.searchsorted(file_ids, np.arange(len(files) + 1)).astype(np.int32)
+    section_rows = np.argsort(section_ids, kind="stable").astype(np.int32)
+    section_ptr = np.searchsorted(np.sort(section_ids), np.arange(len(SECTIONS) + 1))
+    np.save(os.path.join(snap, FILE_PTR_NAME), file_ptr)
+    np.save(os.path.join(snap, SECTION_ROWS_NAME), section_rows)
+    np.save(os.path.join(snap, SECTION_PTR_NAME), section_ptr.astype(np.int32))
+
+    # company -> file ids, for every company in companies.txt
+    companies = {}
+    for name in load_companies():
+        companies[normalize(name)] = match_files(files, name)
+
+    with open(os.path.join(snap, META_NAME), "w", encoding="utf-8") as f:
+        json.dump({"files": files, "sections": SECTIONS, "companies": companies,
+                   "vocab_id": vocab_id}, f, indent=4)
+
+    # answer table is built into the same snapshot, so it is always in sync
+    # with the index
+    if answers:
+        # register the in-memory vectorizer so load_index() doesn't unpickle it again
+        load_shared(vocab_id, lambda: vectorizer)
+        table = build_answer_table(load_index(snap))
+        with open(os.path.join(snap, ANSWERS_NAME), "w", encoding="utf-8") as f:
+            json.dump(table, f)
+        print("Answer table:", sum(len(v) for v in table["table"].values()), "company x intent entries")
+
+    version = publish(INDEX_DIR, snap)
+    removed = gc(INDEX_DIR, keep=keep)
+
+    print("Indexed", len(docs), "section-level documents. Snapshot:", version,
+          f"(removed {len(removed)} old)" if removed else "")
+    return snapshot_dir(INDEX_DIR, version)
+
+def load_index(snap):
+    with open(os.path.join(snap, META_NAME), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    answers = None
+    if os.path.exists(os.path.join(snap, ANSWERS_NAME)):
+        with open(os.path.join(snap, ANSWERS_NAME), "r", encoding="utf-8") as f:
+            answers = json.load(f)
+
+    # one in-memory copy when the document index shares this vocabulary
+    vectorizer = load_shared(meta.get("vocab_id"),
+                             lambda: joblib.load(os.path.join(snap, VECTORIZER_NAME)))
+    Q = load_quantized(snap, len(vectorizer.vocabulary_))
+
+    return {
+        "vectorizer": vectorizer,
+        # with a quantized copy resident, full-precision rows stay on disk
+        "X": joblib.load(os.path.join(snap, MATRIX_NAME), mmap_mode="r" if Q else None),
+        "Q": Q,
+        "files": meta["files"],
+        "sections": meta["sections"],
+        "file_ids": np.load(os.path.join(snap, FILE_IDS_NAME), mmap_mode="r"),
+        "section_ids": np.load(os.path.join(snap, SECTION_IDS_NAME), mmap_mode="r"),
+        "file_ptr": np.load(os.path.join(snap, FILE_PTR_NAME)),
+        "section_rows": np.load(os.path.join(snap, SECTION_ROWS_NAME), mmap_mode="r"),
+        "section_ptr": np.load(os.path.join(snap, SECTION_PTR_NAME)),
+        "companies": meta["companies"],
+        "store": TextStore(snap),
+        "answers": answers,
+    }
+
+# reloads automatically when a new snapshot is published
+_index = SnapshotCache(INDEX_DIR, load_index)
 
 def normalize(s):
     return "".join(c.lower() for c in s if c.isalnum())
 
+def load_companies():
+    if not os.path.exists(COMPANIES_PATH):
+        return []
+    with open(COMPANIES_PATH, "r", encoding="utf-8") as f:
+        return [c.strip() for c in f.readlines() if c.strip()]
+
+def load_aliases():
+    if not os.path.exists(ALIASES_PATH):
+        return {}
+    with open(ALIASES_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def match_files(files, company):
+    company_norm = normalize(company)
+    return [i for i, name in enumerate(files) if company_norm in normalize(name)]
+
+def filter_rows(index, allowed_sections, company_filter=None):
+    """
+    Sorted row ids matching any of allowed_sections and, if given, any of
+    the companies in company_filter (a name or a list of names).
+    Company-scoped lookups only touch that company's rows.
+    """
+    sections = index["sections"]
+    codes = [sections.index(s) for s in allowed_sections if s in sections]
+
+    if not company_filter:
+        ptr = index["section_ptr"]
+        rows = [index["section_rows"][ptr[c]:ptr[c + 1]] for c in codes]
+        return np.sort(np.concatenate(rows)) if rows else np.array([], dtype=np.int32)
+
+    if isinstance(company_filter, str):
+        company_filter = [company_filter]
+
+    file_set = set()
+    for company in company_filter:
+        ids = index["companies"].get(normalize(company))
+        if ids is None:
+            # not in companies.txt: match against the (small) file table
+            ids = match_files(index["files"], company)
+        file_set.update(ids)
+
+    ptr = index["file_ptr"]
+    rows = np.array([r for f in sorted(file_set) for r in range(ptr[f], ptr[f + 1])],
+                    dtype=np.int32)
+    return rows[np.isin(index["section_ids"][rows], codes)]
+
+def rescored(X, Q, qv, rows, n_candidates):
+    # approximate scores for `rows`, exact ones for the top candidates
+    scores = approx_scores(Q, qv, rows)
+    cand = np.argsort(-scores, kind="stable")[:n_candidates]
+    scores[cand] = cosine_similarity(qv, X[rows[cand]])[0]
+    return scores
+
+def rank_rows(index, query, allowed_sections, top_k=3, company_filter=None):
+    """
+    [(row, score)] of the top sections for query among allowed_sections
+    (list of codes). company_filter may be one company name or a list.
+    """
+    rows = filter_rows(index, allowed_sections, company_filter)
+    if len(rows) == 0:
+        return []
+
+    # only the filtered rows are scored
+    qv = index["vectorizer"].transform([query])
+    if index["Q"] is None:
+        scores = cosine_similarity(qv, index["X"][rows])[0]
+    else:
+        scores = rescored(index["X"], index["Q"], qv, rows, top_k * RESCORE_FACTOR)
+
+    # stable sort: ties (e.g. a company whose text has no query terms)
+    # keep index order, so a company filter always returns its sections
+    top = np.argsort(-scores, kind="stable")[:top_k]
+    return [(int(rows[t]), float(scores[t])) for t in top]
+
+def format_results(index, ranked):
+    return [
+        {
+            "file": index["files"][index["file_ids"][row]],
+            "section": index["sections"][index["section_ids"][row]],
+            "score": score,
+            "text": index["store"].get(row, max_chars=500)
+        }
+        for row, score in ranked
+    ]
+
 def search_section(query, allowed_sections, top_k=3, company_filter=None):
-    vectorizer = joblib.load(VECTORIZER_PATH)
-    X = joblib.load(MATRIX_PATH)
+    index = _index.get()
+    ranked = rank_rows(index, query, allowed_sections, top_k, company_filter)
+    return format_results(index, ranked)
 
-    with open(META_PATH, "r", encoding="utf-8") as f:
-        meta = json.load(f)
+ANSWER_TOP_K = 3
+
+def build_answer_table(index):
+    """
+    Ranked results of canonical_query() for every company (as
+    ask_sectioned.detect_company() returns it) x intent, on a loaded
+    section index. Stored as row ids + scores.
+    """
+    names = load_companies() + list(load_aliases().values())
+    table = {}
+
+    for name in names:
+        key = normalize(name)
+        if key in table:
+            continue
+        table[key] = {
+            intent: rank_rows(index, canonical_query(name, intent), INTENT_TO_SECTION[intent],
+                              top_k=ANSWER_TOP_K, company_filter=name)
+            for intent in INTENT_TO_KEYWORDS
+        }
 
-    qv = vectorizer.transform([query])
-    scores = cosine_similarity(qv, X)[0]
+    return {"top_k": ANSWER_TOP_K, "table": table}
 
-    scored = []
-    fallback_candidates = []
+def lookup_answer(company, intent, top_k=3):
+    """
+    Precomputed results for a company + intent pair from the published
+    snapshot, or None when the snapshot has no answer table / entry.
+    """
+    index = _index.get()
+    answers = index["answers"]
+    if answers is None or top_k > answers["top_k"]:
+        return None
 
-    company_norm = normalize(company_filter) if company_filter else None
+    ranked = answers["table"].get(normalize(company), {}).get(intent)
+    if ranked is None:
+        return None
+    return format_results(index, ranked[:top_k])
 
-    for i, (m, s) in enumerate(zip(meta, scores)):
-        if m["section"] not in allowed_sections:
+def evaluate_quantized(bits=8, top_k=3, n_candidates=None,
+                       queries_path="data/intent/test_intents.jsonl"):
+    """
+    Compare quantized scoring against the exact cosine path of
+    search_section() on the published snapshot, with each query's section
+    filter applied (taken from its intent label, e.g. ENV_TARGETS -> ENV).
+    Reports memory and recall@k of the first pass alone and after exact
+    rescoring of n_candidates rows (default top_k * RESCORE_FACTOR, capped
+    below the filtered row count so rescoring can't cover every row).
+    """
+    index = _index.get()
+    X = index["X"].tocsr()
+    Q = quantize(X, bits=bits)
+
+    with open(queries_path, "r", encoding="utf-8") as f:
+        queries = [json.loads(line) for line in f if line.strip()]
+
+    first_pass, after_rescore, candidates = [], [], []
+    for q in queries:
+        rows = filter_rows(index, [q["label"].split("_")[0]])
+        if len(rows) <= top_k:
             continue
+        n = min(n_candidates or top_k * RESCORE_FACTOR, len(rows) - 1)
+
+        qv = index["vectorizer"].transform([q["text"]])
+        truth = set(np.argsort(-cosine_similarity(qv, X[rows])[0], kind="stable")[:top_k])
+        approx = set(np.argsort(-approx_scores(Q, qv, rows), kind="stable")[:top_k])
+        rescore = set(np.argsort(-rescored(X, Q, qv, rows, n), kind="stable")[:top_k])
+
+        first_pass.append(len(truth & approx) / top_k)
+        after_rescore.append(len(truth & rescore) / top_k)
+        candidates.append(n / len(rows))
+
+    full, small = nbytes_csr(X), nbytes_quantized(Q)
+    report = {
+        "bits": bits,
+        "bytes_full": full,
+        "bytes_quantized": small,
+        "saved": 1 - small / full,
+        "queries": len(first_pass),
+        "recall_first_pass": float(np.mean(first_pass)),
+        "recall_rescored": float(np.mean(after_rescore)),
+        "rescored_fraction": float(np.mean(candidates)),
+    }
 
-        file_norm = normalize(m["file"])
-
-        if company_norm:
-            if company_norm in file_norm:
-                fallback_candidates.append(i)
-            else:
-                continue
-
-        scored.append((i, s))
-
-    # Standard TF-IDF scoring
-    if scored:
-        scored = sorted(scored, key=lambda x: x[1], reverse=True)[:top_k]
-        return [
-            {
-                "file": meta[idx]["file"],
-                "section": meta[idx]["section"],
-                "score": float(sc),
-                "text": meta[idx]["text"][:500]
-            }
-            for idx, sc in scored
-        ]
-
-    # Fallback: company matched but TF-IDF found no close text
-    if company_norm and fallback_candidates:
-        idx = fallback_candidates[0]
-        return [
-            {
-                "file": meta[idx]["file"],
-                "section": meta[idx]["section"],
-                "score": 0.0,
-                "text": meta[idx]["text"][:500]
-            }
-        ]
-
-    return []
+    print(f"{bits}-bit: {small} bytes vs {full} full precision "
+          f"({100 * report['saved']:.1f}% saved)")
+    print(f"recall@{top_k} over {report['queries']} section-filtered queries: "
+          f"first pass {report['recall_first_pass']:.3f}, "
+          f"rescored {report['recall_rescored']:.3f} "
+          f"({100 * report['rescored_fraction']:.0f}% of filtered rows rescored)")
+    return report
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--build", action="store_true")
+    parser.add_argument("--keep", type=int, default=2, help="Snapshots to keep after a build (at least 2)")
+    parser.add_argument("--quantize", type=int, choices=[0, 8, 16], default=None,
+                        help="Also store an 8/16-bit matrix for first-pass scoring, 0 to drop it "
+                             "(default: as in current snapshot)")
+    parser.add_argument("--eval-quant", type=int, choices=[8, 16], default=0,
+                        help="Report memory and recall@k of quantized scoring")
+    parser.add_argument("--answers", action=argparse.BooleanOptionalAction, default=None,
+                        help="Precompute company x intent answers (default: as in current snapshot)")
+    parser.add_argument("--topk", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=None,
+                        help="Rows rescored exactly in --eval-quant")
     args = parser.parse_args()
 
     if args.build:
-        build_index()
+        build_index(keep=args.keep, quantize_bits=args.quantize, answers=args.answers)
+    elif args.eval_quant:
+        evaluate_quantized(bits=args.eval_quant, top_k=args.topk, n_candidates=args.candidates)
@@ -0,0 +1,27 @@
+# Intent -> query keywords / index sections, shared by the query CLI
+# (ask_sectioned.py) and the answer-table build (index_sections.py)
+
+INTENT_TO_KEYWORDS = {
+    "ENV_TARGETS": ["emissions", "targets", "net zero"],
+    "ENV_POLICIES": ["climate", "policy", "renewable"],
+    "SOC_POLICIES": ["employee", "diversity", "training"],
+    "SOC_IMPACT": ["community", "impact", "CSR"],
+    "GOV_STRUCTURE": ["board", "committee", "oversight"],
+    "GOV_COMPLIANCE": ["audit", "compliance", "ethics"]
+}
+
+INTENT_TO_SECTION = {
+    "ENV_TARGETS": ["ENV"],
+    "ENV_POLICIES": ["ENV"],
+    "SOC_POLICIES": ["SOC"],
+    "SOC_IMPACT": ["SOC"],
+    "GOV_STRUCTURE": ["GOV"],
+    "GOV_COMPLIANCE": ["GOV"]
+}
+
+def boosted_query(query, intent):
+    return query + " " + " ".join(INTENT_TO_KEYWORDS[intent])
+
+def canonical_query(company, intent):
+    # what a company + intent question is scored as, live or in the answer table
+    return boosted_query(company, intent)
@@ -0,0 +1,79 @@
+import os
+import numpy as np
+
+# Compressed copy of a CSR TF-IDF matrix for first-pass scoring:
+# - weights scaled by their row maximum and rounded to 8 or 16 bits
+# - column indices in uint16 when the vocabulary fits, else int32
+# The full-precision matrix stays on disk and is only read to rescore the
+# top candidates.
+QUANT_NAMES = ["q_data", "q_indices", "q_indptr", "q_scale"]
+
+def quantize(X, bits=8):
+    X = X.tocsr()
+    levels = (1 << bits) - 1
+    data_dtype = np.uint8 if bits == 8 else np.uint16
+    index_dtype = np.uint16 if X.shape[1] <= 1 << 16 else np.int32
+    indptr_dtype = np.int32 if X.nnz < 2 ** 31 else np.int64
+
+    row_max = np.zeros(X.shape[0], dtype=np.float64)
+    nonempty = np.diff(X.indptr) > 0
+    row_max[nonempty] = np.maximum.reduceat(X.data, X.indptr[:-1][nonempty])
+    row_of_nnz = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+
+    safe_max = np.where(row_max > 0, row_max, 1.0)
+    q_data = np.rint(X.data / safe_max[row_of_nnz] * levels).astype(data_dtype)
+
+    return {
+        "q_data": q_data,
+        "q_indices": X.indices.astype(index_dtype),
+        "q_indptr": X.indptr.astype(indptr_dtype),
+        # dequantized weight = q * q_scale[row]
+        "q_scale": (row_max / levels).astype(np.float32),
+        "shape": X.shape,
+    }
+
+def save_quantized(snap, Q):
+    for name in QUANT_NAMES:
+        np.save(os.path.join(snap, name + ".npy"), Q[name])
+
+def stored_bits(snap):
+    # 8 or 16 when the snapshot holds a quantized matrix, else 0
+    path = os.path.join(snap, "q_data.npy")
+    if not os.path.exists(path):
+        return 0
+    return np.load(path, mmap_mode="r").dtype.itemsize * 8
+
+def load_quantized(snap, n_features):
+    if not os.path.exists(os.path.join(snap, "q_data.npy")):
+        return None
+    Q = {name: np.load(os.path.join(snap, name + ".npy")) for name in QUANT_NAMES}
+    Q["shape"] = (len(Q["q_indptr"]) - 1, n_features)
+    return Q
+
+def approx_scores(Q, qv, rows=None):
+    # dot product of the compressed rows (all, or only `rows`) with the
+    # (l2-normalized) query
+    q = np.zeros(Q["shape"][1], dtype=np.float32)
+    q[qv.indices] = qv.data
+
+    indptr = Q["q_indptr"]
+    if rows is None:
+        nnz = slice(None)
+        bounds = indptr
+        scale = Q["q_scale"]
+    else:
+        starts, lens = indptr[rows], indptr[rows + 1] - indptr[rows]
+        bounds = np.concatenate([[0], np.cumsum(lens)])
+        # positions of the selected rows' entries in q_data / q_indices
+        nnz = np.repeat(starts - bounds[:-1], lens) + np.arange(bounds[-1])
+        scale = Q["q_scale"][rows]
+
+    w = Q["q_data"][nnz] * q[Q["q_indices"][nnz]]
+    csum = np.concatenate([[0.0], np.cumsum(w, dtype=np.float64)])
+    return (csum[bounds[1:]] - csum[bounds[:-1]]) * scale
+
+def nbytes_csr(X):
+    return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+
+def nbytes_quantized(Q):
+    return sum(Q[name].nbytes for name in QUANT_NAMES)
@@ -0,0 +1,148 @@
+import os
+import pickle
+import time
+import uuid
+import shutil
+import threading
+import weakref
+
+# Each build writes into <index_dir>/snapshots/<version>/ and is published by
+# atomically replacing the CURRENT pointer file, so readers never see a
+# vectorizer from one build next to a matrix from another.
+SNAPSHOTS_DIR = "snapshots"
+CURRENT_NAME = "CURRENT"
+
+TMP_PREFIX = ".tmp-"
+
+# the current snapshot and the one before it: a reader may have read the
+# old CURRENT and not loaded it yet when the next build publishes
+MIN_KEEP = 2
+
+def new_snapshot(index_dir):
+    # builds write under a temp name; publish() renames it into place,
+    # so gc() never counts or deletes a snapshot still being written
+    # (timestamp with microseconds first so versions sort by build time)
+    now = time.time()
+    version = (time.strftime("%Y%m%dT%H%M%S", time.localtime(now)) +
+               f"{int(now % 1 * 1e6):06d}-" + uuid.uuid4().hex[:6])
+    path = os.path.join(index_dir, SNAPSHOTS_DIR, TMP_PREFIX + version)
+    os.makedirs(path)
+    return path
+
+def publish(index_dir, snapshot_dir):
+    version = os.path.basename(os.path.normpath(snapshot_dir))
+    if version.startswith(TMP_PREFIX):
+        version = version[len(TMP_PREFIX):]
+        os.rename(snapshot_dir, os.path.join(index_dir, SNAPSHOTS_DIR, version))
+
+    tmp = os.path.join(index_dir, CURRENT_NAME + ".tmp")
+
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp, os.path.join(index_dir, CURRENT_NAME))
+    return version
+
+def dump_pickle(obj, path):
+    # for objects without large arrays (a vectorizer's term dict): the C pickler
+    # is ~15x faster than joblib.dump, and joblib.load reads the file as before
+    with open(path, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def link_or_copy(src, dst):
+    # identical artifact in another snapshot: a hard link costs no space and
+    # survives gc() of either snapshot
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def current_version(index_dir):
+    try:
+        with open(os.path.join(index_dir, CURRENT_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def snapshot_dir(index_dir, version):
+    if version is None:
+        raise FileNotFoundError(
+            f"No published snapshot in {index_dir}; run the index build (--build) first.")
+    return os.path.join(index_dir, SNAPSHOTS_DIR, version)
+
+def gc(index_dir, keep=2):
+    """
+    Delete all but the `keep` newest published snapshots. The current one
+    is never removed, and temp directories of builds in progress are ignored.
+    Processes that loaded an older snapshot keep working: its files are
+    already read or memory-mapped. One that read CURRENT but had not loaded
+    it yet reloads from the new pointer (SnapshotCache.get).
+    """
+    if keep < MIN_KEEP:
+        raise ValueError(f"keep must be at least {MIN_KEEP}, got {keep}")
+
+    root = os.path.join(index_dir, SNAPSHOTS_DIR)
+    if not os.path.isdir(root):
+        return []
+
+    current = current_version(index_dir)
+    versions = sorted((v for v in os.listdir(root) if not v.startswith(TMP_PREFIX)),
+                      reverse=True)
+    stale = [v for v in versions[keep:] if v != current]
+
+    for v in stale:
+        shutil.rmtree(os.path.join(root, v), ignore_errors=True)
+    return stale
+
+class SnapshotCache:
+    """
+    Holds the loaded published snapshot for a long-running process.
+    get() re-reads the pointer and loads the new snapshot when it changed;
+    callers keep the object they got, so in-flight queries finish on the
+    snapshot they started with.
+    """
+
+    def __init__(self, index_dir, loader):
+        self.index_dir = index_dir
+        self.loader = loader
+        self.version = None
+        self.index = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = current_version(self.index_dir)
+        if self.index is not None and version == self.version:
+            return self.index
+
+        with self.lock:
+            if self.index is None or version != self.version:
+                try:
+                    index = self.loader(snapshot_dir(self.index_dir, version))
+                except FileNotFoundError:
+                    # removed by gc() after newer builds published: load the
+                    # snapshot CURRENT points to now, once
+                    newer = current_version(self.index_dir)
+                    if newer == version:
+                        raise
+                    version = newer
+                    index = self.loader(snapshot_dir(self.index_dir, version))
+                self.index, self.version = index, version
+            return self.index
+
+# artifacts shared by snapshots of different indexes (e.g. one vocabulary),
+# kept once in memory for as long as any loaded snapshot uses them
+_shared = weakref.WeakValueDictionary()
+_shared_lock = threading.Lock()
+
+def load_shared(key, loader):
+    if key is None:
+        return loader()
+
+    with _shared_lock:
+        obj = _shared.get(key)
+        if obj is None:
+            obj = loader()
+            _shared[key] = obj
+        return obj
@@ -0,0 +1,44 @@
+import os
+import mmap
+import numpy as np
+
+# Texts live in one UTF-8 blob; an int64 offset table marks where each entry
+# starts, so readers only touch the bytes of the entries they return.
+BLOB_NAME = "texts.bin"
+OFFSETS_NAME = "texts_offsets.npy"
+
+def write_store(index_dir, texts):
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+
+    with open(os.path.join(index_dir, BLOB_NAME), "wb") as f:
+        for i, t in enumerate(texts):
+            b = (t or "").encode("utf-8")
+            f.write(b)
+            offsets[i + 1] = offsets[i] + len(b)
+
+    np.save(os.path.join(index_dir, OFFSETS_NAME), offsets)
+
+class TextStore:
+    def __init__(self, index_dir):
+        self.offsets = np.load(os.path.join(index_dir, OFFSETS_NAME), mmap_mode="r")
+
+        blob_path = os.path.join(index_dir, BLOB_NAME)
+        if os.path.getsize(blob_path) == 0:
+            # mmap refuses empty files
+            self.blob = b""
+        else:
+            with open(blob_path, "rb") as f:
+                self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, i, max_chars=None):
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+
+        # a UTF-8 character is at most 4 bytes, so this covers max_chars
+        if max_chars is not None:
+            end = min(end, start + 4 * max_chars)
+
+        text = self.blob[start:end].decode("utf-8", errors="ignore")
+        return text[:max_chars] if max_chars is not None else text
@@ -0,0 +1,267 @@
+import os
+import sys
+import tempfile
+
+# in-process checks for the pieces the CLI matrix (run_tests.py) can't see;
+# run from the repo root: python tests/run_checks.py
+sys.path.insert(0, "scripts")
+
+def check_dedup_stats():
+    from clean_and_segment import MinHashDeduper
+
+    boiler = ("This report contains forward-looking statements that involve risks "
+              "and uncertainties and actual results may differ materially.")
+    unique = ("Our renewable electricity share rose to 62 percent across all "
+              "manufacturing sites during the reporting year.")
+    other = ("The board audit committee met eleven times to review compliance, "
+             "ethics and enterprise risk management matters.")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = os.path.join(tmp, "sigs.npz")
+
+        d = MinHashDeduper(store_path=store)
+        kept, stats = d.filter("a.txt", [boiler, unique, boiler, boiler + " "], "a")
+        if kept != [boiler, unique] or stats["dropped_within"] != 2:
+            print("within-document dedup:", stats)
+            return "FAIL"
+        d.save()
+
+        d = MinHashDeduper(store_path=store)
+        if not d.unchanged("a.txt", "a") or d.unchanged("a.txt", "a changed"):
+            print("content hash not persisted")
+            return "FAIL"
+
+        # persisted cross-corpus store: a second report repeating the boilerplate
+        d = MinHashDeduper(cross_corpus=True, store_path=store)
+        if d.sigs:
+            print("cross-corpus run kept the within-document store")
+            return "FAIL"
+        d.filter("a.txt", [boiler, unique], "a")
+        d.save()
+        d = MinHashDeduper(cross_corpus=True, store_path=store)
+        kept, stats = d.filter("b.txt", [boiler, other], "b")
+        if kept != [other] or stats["dropped_cross"] != 1:
+            print("cross-corpus dedup:", stats)
+            return "FAIL"
+
+        # b.txt dropped a paragraph because a.txt held it: rebuilding a.txt rebuilds b.txt
+        if d.dependents({"a.txt"}) != {"a.txt", "b.txt"} or d.dependents({"b.txt"}) != {"b.txt"}:
+            print("dependents:", d.dependents({"a.txt"}))
+            return "FAIL"
+        d.save()
+        if MinHashDeduper(cross_corpus=True, store_path=store).matched != {"b.txt": {"a.txt"}}:
+            print("matched files not persisted")
+            return "FAIL"
+
+        # forgetting a file only removes its own signatures
+        d.forget("a.txt")
+        kept, _ = d.filter("c.txt", [boiler, other], "c")
+        if kept != [boiler]:
+            print("forget() removed the wrong signatures:", kept)
+            return "FAIL"
+
+        # a store written in the other mode is discarded
+        d = MinHashDeduper(store_path=store)
+        if d.sigs or d.hashes or d.matched:
+            print("within-document run kept the cross-corpus store")
+            return "FAIL"
+
+    return "PASS"
+
+def check_quantized_recall():
+    import numpy as np
+    from scipy import sparse
+    from sklearn.preprocessing import normalize
+    from quantized import quantize, approx_scores
+
+    # synthetic l2-normalized tf-idf-like matrix, fixed seed
+    rng = np.random.RandomState(0)
+    X = normalize(sparse.random(500, 2000, density=0.05, format="csr", random_state=rng))
+    queries = normalize(sparse.random(50, 2000, density=0.05, format="csr", random_state=rng))
+    rows = np.arange(0, 500, 3)
+
+    for bits, min_recall in [(8, 0.9), (16, 0.99)]:
+        Q = quantize(X, bits=bits)
+        recalls = []
+        for i in range(queries.shape[0]):
+            qv = queries[i]
+            exact = (X @ qv.T).toarray().ravel()
+            approx = approx_scores(Q, qv)
+            if not np.allclose(approx_scores(Q, qv, rows), approx[rows]):
+                print("row-subset scores differ from full scores")
+                return "FAIL"
+            truth = set(np.argsort(-exact, kind="stable")[:10])
+            got = set(np.argsort(-approx, kind="stable")[:10])
+            recalls.append(len(truth & got) / 10)
+        print(f"{bits}-bit first-pass recall@10: {np.mean(recalls):.3f}")
+        if np.mean(recalls) < min_recall:
+            return "FAIL"
+
+    # on the published section index, section-filtered like search_section()
+    from index_sections import evaluate_quantized
+    report = evaluate_quantized(bits=8, top_k=3)
+    if report["rescored_fraction"] >= 1 or report["recall_first_pass"] < 0.9:
+        return "FAIL"
+
+    return "PASS"
+
+def check_multi_company_filter():
+    from index_sections import search_section
+
+    single = {c: search_section("emissions board", ["ENV", "GOV"], top_k=10, company_filter=c)
+              for c in ["Infosys", "Morgan Stanley"]}
+    both = search_section("emissions board", ["ENV", "GOV"], top_k=10,
+                          company_filter=["Infosys", "Morgan Stanley"])
+
+    key = lambda r: (r["file"], r["section"])
+    if not single["Infosys"] or not single["Morgan Stanley"]:
+        print("single-company filter returned nothing")
+        return "FAIL"
+    if sorted(map(key, both)) != sorted(map(key, single["Infosys"] + single["Morgan Stanley"])):
+        print("multi-company results are not the union of single-company results")
+        return "FAIL"
+    if any(r["section"] not in ("ENV", "GOV") for r in both):
+        print("section filter not applied")
+        return "FAIL"
+    if [r["score"] for r in both] != sorted((r["score"] for r in both), reverse=True):
+        print("results not ranked by score")
+        return "FAIL"
+    if search_section("emissions", ["ENV"], company_filter="Apple"):
+        print("unknown company matched rows")
+        return "FAIL"
+
+    return "PASS"
+
+def check_answer_table():
+    import index_sections
+    from intents import INTENT_TO_KEYWORDS, INTENT_TO_SECTION, canonical_query
+    from ask_sectioned import ask
+
+    if index_sections._index.get()["answers"] is None:
+        print("published snapshot has no answer table (build with --answers)")
+        return "FAIL"
+
+    # table entries must equal live scoring of the same canonical query
+    names = index_sections.load_companies() + list(index_sections.load_aliases().values())
+    for name in names:
+        for intent in INTENT_TO_KEYWORDS:
+            table = index_sections.lookup_answer(name, intent)
+            live = index_sections.search_section(canonical_query(name, intent),
+                                                 INTENT_TO_SECTION[intent], top_k=3,
+                                                 company_filter=name)
+            if table != live:
+                print("table differs from live scoring:", name, intent)
+                return "FAIL"
+
+    out = ask("What are Infosys's emissions targets?")
+    if out["source"] != "answer_table":
+        print("canonical question not served from the table")
+        return "FAIL"
+    if ask("What are Infosys's emissions reduction goals?")["source"] != "live":
+        print("free-form question served from the table")
+        return "FAIL"
+
+    return "PASS"
+
+def check_unified_build():
+    import numpy as np
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.preprocessing import normalize
+    import index_ir
+    import index_sections
+    from build_indexes import VOCAB_PARAMS
+
+    sec, doc = index_sections._index.get(), index_ir._index.get()
+    vectorizer = sec["vectorizer"]
+
+    # one vocabulary object shared by both loaded indexes
+    if vectorizer is not doc["vectorizer"]:
+        print("section and document indexes hold separate vectorizers")
+        return "FAIL"
+    if vectorizer.vocabulary is not None:
+        print("vectorizer keeps a second copy of its term dict")
+        return "FAIL"
+
+    # document row = tf-idf of the summed counts of its section rows
+    counter = CountVectorizer(**VOCAB_PARAMS, vocabulary=vectorizer.vocabulary_)
+    Xd = doc["X"].tocsr()
+    for d, name in enumerate(doc["ids"]):
+        f = sec["files"].index(name)
+        rows = range(sec["file_ptr"][f], sec["file_ptr"][f + 1])
+        if not len(rows):
+            continue
+        counts = counter.transform([sec["store"].get(r) for r in rows]).sum(axis=0)
+        expected = normalize(np.asarray(counts) * vectorizer.idf_)
+        if np.abs(Xd[d].toarray() - expected).max() > 1e-9:
+            print("document row is not the sum of its section rows:", name)
+            return "FAIL"
+
+    top = index_ir.search("Infosys climate positive strategy emissions", top_k=1)
+    if not top or not top[0]["file"].startswith("infosys"):
+        print("document retrieval top hit:", top and top[0]["file"])
+        return "FAIL"
+
+    return "PASS"
+
+def check_snapshot_gc():
+    from snapshots import new_snapshot, publish, gc, current_version, SnapshotCache
+
+    def build(index_dir):
+        snap = new_snapshot(index_dir)
+        with open(os.path.join(snap, "x"), "w") as f:
+            f.write("x")
+        return publish(index_dir, snap)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # several builds within one second: gc keeps the two newest
+        versions = [build(tmp) for _ in range(4)]
+        gc(tmp)
+        if sorted(os.listdir(os.path.join(tmp, "snapshots"))) != versions[-2:]:
+            print("gc kept:", os.listdir(os.path.join(tmp, "snapshots")))
+            return "FAIL"
+
+        try:
+            gc(tmp, keep=1)
+            print("gc accepted keep=1")
+            return "FAIL"
+        except ValueError:
+            pass
+
+        # newer builds publish and gc the snapshot a reader is about to load
+        def loader(snap):
+            if not loaded:
+                build(tmp)
+                build(tmp)
+                gc(tmp)
+            loaded.append(os.path.basename(snap))
+            with open(os.path.join(snap, "x")) as f:
+                return f.read()
+
+        loaded = []
+        cache = SnapshotCache(tmp, loader)
+        if cache.get() != "x" or cache.version != current_version(tmp):
+            print("reader did not fall back to the current snapshot:", loaded)
+            return "FAIL"
+
+    return "PASS"
+
+CHECKS = [
+    ("dedup_stats", check_dedup_stats),
+    ("quantized_recall", check_quantized_recall),
+    ("multi_company_filter", check_multi_company_filter),
+    ("answer_table", check_answer_table),
+    ("unified_build", check_unified_build),
+    ("snapshot_gc", check_snapshot_gc),
+]
+
+if __name__ == "__main__":
+    results = []
+    for name, fn in CHECKS:
+        print(f"\n=== Running {name} ===")
+        results.append((name, fn()))
+
+    print("\n=== CHECK SUMMARY ===")
+    for name, r in results:
+        print(f"{name}: {r}")
+
+    sys.exit(0 if all(r == "PASS" for _, r in results) else 1)